@@ -1,17 +1,44 @@
 import numpy as np
-import signal
+import numba as nb
 import curses
+import math
+import time
+import queue
+import threading
+
+#question type names, bit i of modes_allowed enables _MODE_NAMES[i]
+_MODE_NAMES = ("ONE", "TWO", "THREE", "FOUR", "FIVE")
+
+#lookup tables indexed by getch key codes below 256
+_PRINTABLE = [chr(i).isprintable() for i in range(256)]
+_DIGIT = [48 <= i <= 57 for i in range(256)]
+
+#whichever option is in the money gets the intrinsic value on top of the premium, the other is derived from parity
+@nb.vectorize(["float64(float64, float64, float64, float64)"], cache=True)
+def _calc_C(S, K, carry, option_premium):
+    """
+    Description: call price for given S, K, r/c and option premium, rounded to two decimal places
+    """
+
+    return round(max(S - K + carry, 0.0) + option_premium, 2)
+
+@nb.vectorize(["float64(float64, float64, float64, float64)"], cache=True)
+def _calc_P(S, K, carry, option_premium):
+    """
+    Description: put price for given S, K, r/c and option premium, rounded to two decimal places
+    """
+
+    diff = S - K + carry
+    return round(max(diff, 0.0) + option_premium - diff, 2)
 
 def wait_for_char(stdscr, char):
     """
     Description: hacky solution to wait for user to type a character for a given curses window
     """
     while True:
-        try:
-            if (chr(stdscr.getch()) == char):
-                return
-        except:
-            pass
+        ch = stdscr.getch()
+        if (0 <= ch < 0x110000 and chr(ch) == char):
+            return
 
 class PutCallGame():
     """
@@ -29,6 +56,8 @@ class PutCallGame():
 
     """
 
+    _rng = None #generator shared by every game, created by the first one
+
     def __init__(self, modes_allowed:int, time_length:int, stdscr):
         """
         Description:
@@ -56,49 +85,87 @@ class PutCallGame():
 
         self.stdscr = stdscr
 
-        self.allowed_modes = []
-        if (modes_allowed & 0b00001):
-            self.allowed_modes.append("ONE")
+        self.allowed_modes = tuple(name for i, name in enumerate(_MODE_NAMES) if (modes_allowed & (1 << i)))
 
-        if (modes_allowed & 0b00010):
-            self.allowed_modes.append("TWO")
+        self.score = -1
 
-        if (modes_allowed & 0b00100):
-            self.allowed_modes.append("THREE")
+        self.starting_time = time_length
+        self._end_time = None #time.monotonic() value at which the current game ends
+
+        #first lines of the question for each problem type and hidden value, the S/K/r/c lines are added in generate_problem
+        self._templates = {
+            "ONE_C": 'C = ?\nP = {}',
+            "ONE_P": 'C = {}\nP = ?',
+            "TWO": 'Combo = {}\nS = ?',
+            "THREE_C": 'C = ?\nStraddle = {}',
+            "THREE_P": 'P = ?\nStraddle = {}',
+            "FOUR_C": 'C = ?\nB/W = {}',
+            "FOUR_P": 'P = ?\nB/W = {}',
+            "FIVE_C": 'C = ?\nP&S = {}',
+            "FIVE_P": 'P = ?\nP&S = {}',
+        }
+
+        if (PutCallGame._rng is None):
+            PutCallGame._rng = np.random.default_rng()
+        self.rng = PutCallGame._rng
+
+        #pool of pre-drawn random values consumed one row per problem
+        self._pool_size = 1024
+        self._refill_pool()
+
+        #finished problems prepared by a background thread during a game
+        self._queue_size = 64
+        self._queue = queue.Queue(maxsize=self._queue_size)
+        self._producer_thread = None
 
-        if (modes_allowed & 0b01000):
-            self.allowed_modes.append("FOUR")
+        self.is_playing = False
 
-        if (modes_allowed & 0b10000):
-            self.allowed_modes.append("FIVE")
+    def _refill_pool(self):
+        """
+        Description: computes the prices for the next _pool_size problems in one batch, rather than several scalar rng calls per problem
+        """
 
-        self.score = -1
+        K = self.rng.integers(2,21,self._pool_size) * 5
+        rand = self.rng.random((self._pool_size,3), dtype=np.float32).astype(np.float64)
 
-        self.starting_time = time_length
-        self.timer = [-1] #what the signal alarm will affect
+        S = np.round(20*rand[:,0] - 10 + K, 2)
+        carry = np.round(rand[:,1], 2)
+        option_premium = np.round(10*rand[:,2] + 0.01, 2)
 
-        self.rng = np.random.default_rng()
+        C = _calc_C(S, K, carry, option_premium)
+        P = _calc_P(S, K, carry, option_premium)
 
-        self.is_playing = False
+        #rows of native python numbers so generate_prices does no numpy work
+        self._pool = list(zip(K.tolist(), S.tolist(), carry.tolist(), C.tolist(), P.tolist()))
 
-    def alarm_handler(self, signum, frame):
-        """signal handler used to update the time left in the game"""
+        #question type and whether to hide C (rather than P) for each row, used by generate_problem
+        self._ptypes = self.rng.integers(0, len(self.allowed_modes), self._pool_size).tolist()
+        self._coins = (self.rng.random(self._pool_size) > 0.5).tolist()
+        self._pool_idx = 0
 
-        if (self.timer[0] >= 0):
-            self.timer[0] -= 1
+    def _producer(self):
+        """
+        Description: keeps the problem queue topped up while a game is running so play_question never waits on generation
+        """
+
+        while (self.is_playing):
+            problem = self.generate_problem()
+
+            #time out periodically so the thread notices when the game ends
+            while (self.is_playing):
+                try:
+                    self._queue.put(problem, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
 
     def reset(self):
         """
         Description: resets the game until play is called again
         """
-        self.timer[0] = -1
+        self._end_time = None
         self.score = -1
 
-        # Stop the interval timer
-        signal.setitimer(signal.ITIMER_REAL, 0)
-        # Reset the signal handler for SIGALRM to default
-        signal.signal(signal.SIGALRM, signal.SIG_DFL)
-
         self.is_playing = False
 
     def play(self):
@@ -111,15 +178,13 @@ class PutCallGame():
         self.stdscr.refresh()
 
         self.score = 0
-        self.timer[0] = self.starting_time
+        self._end_time = time.monotonic() + self.starting_time
         self.is_playing = True
 
-
-        # Set up the signal handler for SIGALRM
-        signal.signal(signal.SIGALRM, self.alarm_handler)
-
-        # Start the interval timer (decrements every second)
-        signal.setitimer(signal.ITIMER_REAL, 1, 1)
+        # Start preparing problems in the background
+        self._queue = queue.Queue(maxsize=self._queue_size)
+        self._producer_thread = threading.Thread(target=self._producer, daemon=True)
+        self._producer_thread.start()
 
         # Disable cursor
         curses.curs_set(0)
@@ -128,11 +193,15 @@ class PutCallGame():
         self.stdscr.clear()
         self.stdscr.refresh()
 
-        import time
-
         while (self.is_playing):
             self.play_question();
 
+        self._producer_thread.join()
+        self._producer_thread = None
+
+        # Back to fully blocking getch for the menus
+        self.stdscr.timeout(-1)
+
         self.stdscr.clear()
 
         self.stdscr.addstr(1,0, "GAME OVER")
@@ -166,24 +235,13 @@ class PutCallGame():
 
         output = {}
 
-        K = self.rng.integers(2,21) * 5
-
-        S = 20*self.rng.random() - 10 + K
-        S = np.round(S, 2)
-        carry = np.round(self.rng.random(), 2)
+        if (self._pool_idx == self._pool_size):
+            self._refill_pool()
 
-        option_premium = 10*self.rng.random() + 0.01
-        option_premium = np.round(option_premium, 2)
+        i = self._pool_idx
+        self._pool_idx += 1
 
-        if (S + carry >= K):
-            C = S - K + carry + option_premium
-            P = C - S + K - carry
-        else:
-            P = K - S - carry + option_premium
-            C = P + S - K + carry
-
-        C = np.round(C, 2)
-        P = np.round(P, 2)
+        K, S, carry, C, P = self._pool[i]
 
         output["K"] = K
         output["S"] = S
@@ -212,66 +270,74 @@ class PutCallGame():
         """
 
         prices = self.generate_prices()
-        problem_type = self.rng.choice(self.allowed_modes)
+
+        #same pool row generate_prices just used
+        i = self._pool_idx - 1
+        problem_type = self.allowed_modes[self._ptypes[i]]
+        coin = self._coins[i]
+
+        #every question ends with the same market values so only format them once
+        tail_K = f'\nK = {prices["K"]}\nr/c = {prices["r/c"]}'
+        tail = f'\nS = {prices["S"]}' + tail_K
 
         market_values = ""
         answer = ""
 
         if (problem_type == "ONE"):
             #determine whether C or P should be solved for
-            if (self.rng.random() > 0.5):
+            if (coin):
                 #hide C
-                market_values = f'C = ?\nP = {prices["P"]}\nS = {prices["S"]}\nK = {prices["K"]}\nr/c = {prices["r/c"]}'
-                answer = prices["C"]
+                market_values = self._templates["ONE_C"].format(prices["P"]) + tail
+                answer = round(float(prices["C"]), 2)
 
             else:
                 #hide P
-                market_values = f'C = {prices["C"]}\nP = ?\nS = {prices["S"]}\nK = {prices["K"]}\nr/c = {prices["r/c"]}'
-                answer = prices["P"]
+                market_values = self._templates["ONE_P"].format(prices["C"]) + tail
+                answer = round(float(prices["P"]), 2)
 
         elif (problem_type == "TWO"):
 
             combo = prices["S"] - prices["K"] + prices["r/c"]
-            combo = np.round(combo, 2)
-            market_values = f'Combo = {combo}\nS = ?\nK = {prices["K"]}\nr/c = {prices["r/c"]}'
-            answer = prices["S"]
+            combo = round(float(combo), 2)
+            market_values = self._templates["TWO"].format(combo) + tail_K
+            answer = round(float(prices["S"]), 2)
 
         elif (problem_type == "THREE"):
             straddle = prices["C"] + prices["P"]
-            straddle = np.round(straddle, 2)
+            straddle = round(float(straddle), 2)
 
             #decide whether C or P will be hidden
-            if (self.rng.random() > 0.5):
-                market_values = f'C = ?\nStraddle = {straddle}\nS = {prices["S"]}\nK = {prices["K"]}\nr/c = {prices["r/c"]}'
-                answer = prices["C"]
+            if (coin):
+                market_values = self._templates["THREE_C"].format(straddle) + tail
+                answer = round(float(prices["C"]), 2)
             else:
-                market_values = f'P = ?\nStraddle = {straddle}\nS = {prices["S"]}\nK = {prices["K"]}\nr/c = {prices["r/c"]}'
-                answer = prices["P"]
+                market_values = self._templates["THREE_P"].format(straddle) + tail
+                answer = round(float(prices["P"]), 2)
 
         elif (problem_type == "FOUR"):
             b_w = prices["C"] + prices["K"] - prices["S"]
-            b_w = np.round(b_w, 2)
+            b_w = round(float(b_w), 2)
 
-            if (self.rng.random() > 0.5):
+            if (coin):
                 #C
-                market_values = f'C = ?\nB/W = {b_w}\nS = {prices["S"]}\nK = {prices["K"]}\nr/c = {prices["r/c"]}'
-                answer = prices["C"]
+                market_values = self._templates["FOUR_C"].format(b_w) + tail
+                answer = round(float(prices["C"]), 2)
             else:
                 #P
-                market_values = f'P = ?\nB/W = {b_w}\nS = {prices["S"]}\nK = {prices["K"]}\nr/c = {prices["r/c"]}'
-                answer = prices["P"]
+                market_values = self._templates["FOUR_P"].format(b_w) + tail
+                answer = round(float(prices["P"]), 2)
         elif (problem_type == "FIVE"):
             p_s = prices["P"] + prices["S"] - prices["K"]
-            p_s = np.round(p_s, 2)
+            p_s = round(float(p_s), 2)
 
-            if (self.rng.random() > 0.5):
+            if (coin):
                 #C
-                market_values = f'C = ?\nP&S = {p_s}\nS = {prices["S"]}\nK = {prices["K"]}\nr/c = {prices["r/c"]}'
-                answer = prices["C"]
+                market_values = self._templates["FIVE_C"].format(p_s) + tail
+                answer = round(float(prices["C"]), 2)
             else:
                 #P
-                market_values = f'P = ?\nP&S = {p_s}\nS = {prices["S"]}\nK = {prices["K"]}\nr/c = {prices["r/c"]}'
-                answer = prices["P"]
+                market_values = self._templates["FIVE_P"].format(p_s) + tail
+                answer = round(float(prices["P"]), 2)
 
         return market_values, answer
 
@@ -281,52 +347,87 @@ class PutCallGame():
 
         """
 
-        question, answer = self.generate_problem()
+        question, answer = self._queue.get()
 
-        target = str(answer).strip()
+        # answers are checked by value so e.g. 3, 3.0 and 3.00 are all accepted
+        target = float(answer)
+        # shortest way to type the answer (allowing for a dropped leading 0), shorter input is not checked
+        min_len = len(f"{target:g}") - 1
 
+        # These do not change while the question is up so only draw them once
         self.stdscr.clear()
-        self.stdscr.refresh()
+        self.stdscr.addstr(1,0, f"Score: {self.score}")
+        self.stdscr.addstr(5,0, question)
+        self.stdscr.addstr(12,0, "Answer:")
 
-        user_input = ""
+        # typed characters are edited in place rather than rebuilding a string each key
+        user_input = bytearray()
         cursor_pos = 0
 
+        # what is currently on screen, None forces the first draw
+        last_timer = None
+        last_input = None
+
+        # local names for everything the input loop touches every pass
+        addstr = self.stdscr.addstr
+        clrtoeol = self.stdscr.clrtoeol
+        refresh = self.stdscr.refresh
+        timeout = self.stdscr.timeout
+        getch = self.stdscr.getch
+        monotonic = time.monotonic
+        end_time = self._end_time
+        KEY_BS = curses.KEY_BACKSPACE
+
         while (self.is_playing):
-            #self.stdscr.erase()
-            self.stdscr.addstr(0,0,f"{self.timer[0]} seconds left")
-            self.stdscr.clrtoeol()
-            self.stdscr.addstr(1,0, f"Score: {self.score}")
-            self.stdscr.clrtoeol()
+            redraw = False
 
-            self.stdscr.addstr(5,0, question)
-            self.stdscr.clrtoeol()
+            time_left = end_time - monotonic()
+            remaining = max(math.ceil(time_left), 0)
 
-            self.stdscr.addstr(12,0, "Answer:")
-            self.stdscr.clrtoeol()
+            if (remaining != last_timer):
+                last_timer = remaining
+                addstr(0,0,f"{last_timer} seconds left")
+                clrtoeol()
+                redraw = True
 
-            self.stdscr.addstr(14, 0, user_input)
-            self.stdscr.clrtoeol()
+            if (user_input != last_input):
+                last_input = bytes(user_input)
+                addstr(14, 0, last_input.decode("latin-1"))
+                clrtoeol()
+                redraw = True
 
-            self.stdscr.refresh()
+            if (redraw):
+                refresh()
 
-            if (self.timer[0] <= 0):
+            if (remaining <= 0):
                 self.is_playing = False
+                return
 
-            ch = self.stdscr.getch()
+            # Block on input, but wake up in time to show the next second of the timer
+            timeout(int((time_left % 1) * 1000) + 1)
+            ch = getch()
 
-            if ch == curses.KEY_BACKSPACE or ch == 127:  # Handle backspace (127 is for some terminals)
+            if ch == KEY_BS or ch == 127:  # Handle backspace (127 is for some terminals)
                 if cursor_pos > 0:
-                    user_input = user_input[:cursor_pos - 1] + user_input[cursor_pos:]
+                    del user_input[cursor_pos - 1]
                     cursor_pos -= 1
-            elif 0 < ch < 256 and chr(ch).isprintable():  # Handle printable characters
-                user_input = user_input[:cursor_pos] + chr(ch) + user_input[cursor_pos:]
+            elif 0 < ch < 256 and _PRINTABLE[ch]:  # Handle printable characters
+                user_input.insert(cursor_pos, ch)
                 cursor_pos += 1
 
-            if (user_input == target):
+            if (len(user_input) < min_len):
+                continue
+
+            try:
+                correct = abs(float(user_input) - target) < 0.005
+            except ValueError:
+                correct = False
 
-                self.stdscr.addstr(14, 0, user_input)
-                self.stdscr.clrtoeol()
-                self.stdscr.refresh()
+            if (correct):
+
+                addstr(14, 0, user_input.decode("latin-1"))
+                clrtoeol()
+                refresh()
                 self.score += 1
 
                 return
@@ -354,24 +455,30 @@ def main(stdscr):
 
         ch = -1
 
-        user_input = ""
+        user_input = bytearray()
         cursor_pos = 0
 
+        addstr = stdscr.addstr
+        clrtoeol = stdscr.clrtoeol
+        refresh = stdscr.refresh
+        getch = stdscr.getch
+        KEY_BS = curses.KEY_BACKSPACE
+
         while (ch not in [10,13, curses.KEY_ENTER]):
 
-            ch = stdscr.getch()
+            ch = getch()
 
-            if ch == curses.KEY_BACKSPACE or ch == 127:  # Handle backspace (127 is for some terminals)
+            if ch == KEY_BS or ch == 127:  # Handle backspace (127 is for some terminals)
                 if cursor_pos > 0:
-                    user_input = user_input[:cursor_pos - 1] + user_input[cursor_pos:]
+                    del user_input[cursor_pos - 1]
                     cursor_pos -= 1
-            elif 48 <= ch <= 57 and chr(ch).isprintable():  # Handle printable characters
-                user_input = user_input[:cursor_pos] + chr(ch) + user_input[cursor_pos:]
+            elif 0 < ch < 256 and _DIGIT[ch]:  # Handle printable characters
+                user_input.insert(cursor_pos, ch)
                 cursor_pos += 1
 
-            stdscr.addstr(1,0, user_input)
-            stdscr.clrtoeol()
-            stdscr.refresh()
+            addstr(1,0, user_input.decode())
+            clrtoeol()
+            refresh()
 
         seconds = int(user_input)
 